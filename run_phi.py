@@ -10,20 +10,74 @@ Endpoints:
 Start:  python run_phi.py
 """
 
+import asyncio
+import bisect
+import copy
+import hashlib
 import json
+import os
+import queue
 import re
 import sys
 import threading
-from collections import defaultdict
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from socketserver import ThreadingMixIn
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+# Cap BLAS/OpenMP intra-op threads before any third-party import can pull
+# in a BLAS library — OpenBLAS/MKL read these when the shared object loads
+# (numpy included). Left to hardware_concurrency() defaults, spaCy's
+# matmuls and concurrent requests oversubscribe the cores and slow each
+# other down. REDACTOR_INTRA tunes the budget.
+_INTRA_THREADS = os.environ.get("REDACTOR_INTRA", "2")
+os.environ.setdefault("OMP_NUM_THREADS", _INTRA_THREADS)
+os.environ.setdefault("MKL_NUM_THREADS", _INTRA_THREADS)
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+# Optional: single-pass multi-string search for Phi-3 value resolution
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Optional: vectorized sorting for the candidate arrays in _redact
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Optional: C-extension JSON codec for request/response bodies
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    class _JSONResponse(JSONResponse):
+        def render(self, content) -> bytes:
+            return orjson.dumps(content)
+else:
+    _JSONResponse = JSONResponse
 
 # ── Model loading ───────────────────────────────────────────────────────────
 
 print("Loading spaCy en_core_web_lg…", flush=True)
 try:
     import spacy
-    _nlp = spacy.load("en_core_web_lg")
+    # Only tok2vec + ner are needed downstream (_spacy_entities reads
+    # ent.label_ and char offsets); skip the rest of the pipeline.
+    _nlp = spacy.load(
+        "en_core_web_lg",
+        exclude=["tagger", "parser", "lemmatizer", "attribute_ruler", "senter"],
+    )
     SPACY_AVAILABLE = True
     print("spaCy ready.", flush=True)
 except Exception as _e:
@@ -31,6 +85,15 @@ except Exception as _e:
     SPACY_AVAILABLE = False
     print(f"Warning: spaCy unavailable ({_e}). Layer 2 disabled.", flush=True)
 
+# torch arrives transitively with some spaCy installs; pin it to the same
+# intra-op budget if present.
+try:
+    import torch
+    torch.set_num_threads(int(_INTRA_THREADS))
+    torch.set_num_interop_threads(1)
+except Exception:
+    pass
+
 print("Loading Phi-3 Mini…", flush=True)
 try:
     from mlx_lm import load as _mlx_load, generate as _mlx_generate
@@ -51,43 +114,158 @@ except Exception as _e:
     PHI3_AVAILABLE = False
     _PHI3_LOCK = threading.Lock()
 
+# Fixed instruction prefix shared by every deep-scan prompt
+_PHI3_PROMPT_BODY = (
+    "List every piece of sensitive information in this text that could "
+    "identify a person or business. Include names, companies, addresses, "
+    "phone numbers, tax IDs, and any other PII. Return as a JSON array of "
+    "{type, value} objects only. No explanation, no markdown, just the "
+    "JSON array.\n\nText:\n"
+)
+
+# Prefill the fixed prefix once and keep its KV-cache; each deep-scan call
+# then resumes from a copy instead of re-prefilling the instructions for
+# every chunk of every request.
+_PHI3_PREFIX_CACHE = None
+if PHI3_AVAILABLE:
+    try:
+        import mlx.core as _mx
+        from mlx_lm.models.cache import make_prompt_cache as _make_prompt_cache
+
+        _prefix_ids = _phi3_tokenizer.encode(f"<|user|>\n{_PHI3_PROMPT_BODY}")
+        _prefix_cache = _make_prompt_cache(_phi3_model)
+        _mx.eval(_phi3_model(_mx.array(_prefix_ids)[None], cache=_prefix_cache))
+        _PHI3_PREFIX_CACHE = _prefix_cache
+        print("Phi-3 prompt prefix cached.", flush=True)
+    except Exception:
+        _PHI3_PREFIX_CACHE = None
+
+# Optional: grammar-constrained JSON decoding via outlines. Every sampled
+# token is then valid JSON — no prose preamble to generate and discard, and
+# no malformed outputs silently dropped by the parser.
+_PHI3_JSON_GENERATOR = None
+if PHI3_AVAILABLE:
+    try:
+        import outlines
+        from pydantic import BaseModel
+
+        class _PiiItem(BaseModel):
+            type: str
+            value: str
+
+        class _PiiSchema(BaseModel):
+            items: list[_PiiItem]
+
+        _PHI3_JSON_GENERATOR = outlines.generate.json(
+            outlines.models.MLXLM(_phi3_model, _phi3_tokenizer), _PiiSchema,
+        )
+        print("Constrained JSON decoding ready (outlines).", flush=True)
+    except Exception:
+        pass
+
 # ── Regex patterns ──────────────────────────────────────────────────────────
 
+# Month names factored once for the DATE pattern: each name is tried a
+# single time per position (optional-suffix form) instead of re-running a
+# 24-branch alternation for both the full and abbreviated spellings.
+_MONTHS = (
+    r"(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?"
+    r"|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|Nov(?:ember)?"
+    r"|Dec(?:ember)?)"
+)
+
+# All patterns except DATE target ASCII-only values (UK identifiers), so
+# they compile with re.ASCII: \b, \d and \s then skip the Unicode
+# category tables inside the matcher.
 _PATTERNS = [
     ("EMAIL", re.compile(
-        r"\b[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}\b"
+        r"\b[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}\b", re.ASCII
     )),
     ("URL", re.compile(
         r"https?://[^\s\"'<>]+"
-        r"|(?<!\w)(?:www\.)[A-Za-z0-9.\-]+\.[A-Za-z]{2,}(?:/[^\s\"'<>]*)?"
+        r"|(?<!\w)(?:www\.)[A-Za-z0-9.\-]+\.[A-Za-z]{2,}(?:/[^\s\"'<>]*)?",
+        re.ASCII,
     )),
     ("PHONE", re.compile(
-        r"(?:\+44\s?|0)(?:\d[\s\-]?){9,10}\d"
+        r"(?:\+44\s?|0)(?:\d[\s\-]?){9,10}\d", re.ASCII
     )),
     ("POSTCODE", re.compile(
-        r"\b[A-Z]{1,2}\d{1,2}[A-Z]?\s?\d[A-Z]{2}\b", re.IGNORECASE
+        r"\b[A-Z]{1,2}\d{1,2}[A-Z]?\s?\d[A-Z]{2}\b", re.IGNORECASE | re.ASCII
     )),
     ("TAX", re.compile(
-        r"\bGB\s?\d{3}\s?\d{4}\s?\d{2}\b", re.IGNORECASE
+        r"\bGB\s?\d{3}\s?\d{4}\s?\d{2}\b", re.IGNORECASE | re.ASCII
     )),
     ("NI", re.compile(
         r"\b[A-CEGHJ-PR-TW-Z]{2}\s?\d{2}\s?\d{2}\s?\d{2}\s?[A-D]\b",
-        re.IGNORECASE,
+        re.IGNORECASE | re.ASCII,
     )),
     ("DATE", re.compile(
         r"\b\d{1,2}[\/\-\.]\d{1,2}[\/\-\.]\d{2,4}\b"
-        r"|\b(?:January|February|March|April|May|June|July|August|September"
-        r"|October|November|December|Jan|Feb|Mar|Apr|Jun|Jul|Aug|Sep|Oct|Nov|Dec)"
-        r"[\s,]+\d{1,2}[\s,]+\d{4}\b"
-        r"|\b\d{1,2}[\s]+"
-        r"(?:January|February|March|April|May|June|July|August|September"
-        r"|October|November|December|Jan|Feb|Mar|Apr|Jun|Jul|Aug|Sep|Oct|Nov|Dec)"
-        r"[\s,]+\d{4}\b",
+        r"|\b" + _MONTHS + r"[\s,]+\d{1,2}[\s,]+\d{4}\b"
+        r"|\b\d{1,2}[\s]+" + _MONTHS + r"[\s,]+\d{4}\b",
         re.IGNORECASE,
     )),
-    ("CURRENCY", re.compile(r"£\s?\d[\d,]*(?:\.\d{2})?")),
+    ("CURRENCY", re.compile(r"£\s?\d[\d,]*(?:\.\d{2})?", re.ASCII)),
 ]
 
+
+def _build_master(patterns: list) -> "re.Pattern":
+    """
+    Merge all patterns into one alternation so the text is scanned once.
+
+    Each pattern keeps its own flags via an inline-scoped group, so e.g.
+    POSTCODE stays case-insensitive while EMAIL does not.
+    """
+    branches = []
+    for label, pat in patterns:
+        local = "".join(
+            ch for ch, flag in (
+                ("a", re.ASCII), ("i", re.IGNORECASE), ("s", re.DOTALL),
+            ) if pat.flags & flag
+        )
+        prefix = f"?{local}:" if local else "?:"
+        branches.append(f"(?P<{label}>({prefix}{pat.pattern}))")
+    return re.compile("|".join(branches))
+
+
+_MASTER = _build_master(_PATTERNS)
+
+# Optional: Hyperscan compiles patterns into one DFA database and scans
+# them in a single pass. Its grammar has no lookaround (the URL pattern's
+# (?<!\w) is out), so probe each pattern individually: supported ones go
+# into the database, the rest stay on per-pattern finditer scans.
+_HS_DB = None
+_HS_UNSUPPORTED = []
+try:
+    import hyperscan as _hyperscan
+
+    def _hs_flags(pat: "re.Pattern") -> int:
+        flags = _hyperscan.HS_FLAG_SOM_LEFTMOST
+        if pat.flags & re.IGNORECASE:
+            flags |= _hyperscan.HS_FLAG_CASELESS
+        return flags
+
+    _hs_ids = []
+    for _idx, (_label, _pat) in enumerate(_PATTERNS):
+        try:
+            _probe = _hyperscan.Database()
+            _probe.compile(
+                expressions=[_pat.pattern.encode()],
+                ids=[0], flags=[_hs_flags(_pat)],
+            )
+            _hs_ids.append(_idx)
+        except Exception:
+            _HS_UNSUPPORTED.append((_label, _pat))
+    if _hs_ids:
+        _HS_DB = _hyperscan.Database()
+        _HS_DB.compile(
+            expressions=[_PATTERNS[i][1].pattern.encode() for i in _hs_ids],
+            ids=_hs_ids,
+            flags=[_hs_flags(_PATTERNS[i][1]) for i in _hs_ids],
+        )
+except Exception:
+    _HS_DB = None
+
 # spaCy entity label → canonical token prefix
 _SPACY_LABEL_MAP = {
     "PERSON": "PERSON",
@@ -118,71 +296,248 @@ _PHI3_LABEL_MAP = {
 }
 
 
+# First JSON array in a Phi-3 completion
+_JSON_ARRAY_RE = re.compile(r"\[.*?\]", re.DOTALL)
+
+
+@lru_cache(maxsize=1024)
+def _compile_ci(value: str) -> "re.Pattern":
+    """Case-insensitive literal pattern for a Phi-3 value, compiled once."""
+    return re.compile(re.escape(value), re.IGNORECASE)
+
+
 # ── Detection helpers ───────────────────────────────────────────────────────
 
 def _regex_entities(text: str) -> list:
     """Return list of (label, value, start, end)."""
     results = []
-    for label, pat in _PATTERNS:
-        for m in pat.finditer(text):
-            results.append((label, m.group(), m.start(), m.end()))
+
+    # Hyperscan reports byte offsets, so only use it when they coincide
+    # with character offsets.
+    if _HS_DB is not None and text.isascii():
+        def _on_match(pat_id, start, end, flags, ctx):
+            results.append((_PATTERNS[pat_id][0], text[start:end], start, end))
+
+        _HS_DB.scan(text.encode(), match_event_handler=_on_match)
+        for label, pat in _HS_UNSUPPORTED:
+            for m in pat.finditer(text):
+                results.append((label, m.group(), m.start(), m.end()))
+        return results
+
+    for m in _MASTER.finditer(text):
+        results.append((m.lastgroup, m.group(), m.start(), m.end()))
     return results
 
 
-def _spacy_entities(text: str) -> list:
+class _SpacyBatcher:
+    """
+    Coalesce concurrent spaCy calls into one nlp.pipe() minibatch.
+
+    Callers (to_thread workers) submit a text and block on a Future; a
+    daemon thread gathers up to BATCH texts arriving within WINDOW seconds
+    and processes them in a single nlp.pipe() call, which amortises Python
+    dispatch and batches the tok2vec matmuls.
+    """
+
+    BATCH = 16
+    WINDOW = 0.02    # gather window, seconds
+    TIMEOUT = 60.0   # per-call bound before the caller falls back
+
+    def __init__(self, nlp):
+        self._nlp = nlp
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, text: str):
+        """Return the spaCy Doc for *text*, processed as part of a batch."""
+        fut = Future()
+        self._queue.put((text, fut))
+        return fut.result(timeout=self.TIMEOUT)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.WINDOW
+            while len(batch) < self.BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                docs = list(self._nlp.pipe(
+                    [text for text, _ in batch], batch_size=self.BATCH,
+                ))
+            except Exception as exc:
+                for _, fut in batch:
+                    fut.set_exception(exc)
+                continue
+            for (_, fut), doc in zip(batch, docs):
+                fut.set_result(doc)
+
+
+_SPACY_BATCHER = _SpacyBatcher(_nlp) if SPACY_AVAILABLE else None
+
+# Inputs longer than this are split on blank lines and batched through
+# nlp.pipe rather than processed as one serial doc.
+_SPACY_CHUNK_THRESHOLD = 20_000
+_SPACY_PROCS = int(os.environ.get("REDACTOR_SPACY_PROCS", "1"))
+
+
+def _split_paragraphs(text: str) -> list:
+    """Split on blank lines, returning (offset, chunk) pairs."""
+    pieces = []
+    offset = 0
+    for chunk in text.split("\n\n"):
+        if chunk:
+            pieces.append((offset, chunk))
+        offset += len(chunk) + 2
+    return pieces
+
+
+def _collect_ents(doc, offset: int, results: list):
+    for ent in doc.ents:
+        label = _SPACY_LABEL_MAP.get(ent.label_)
+        if label:
+            results.append(
+                (label, ent.text, ent.start_char + offset, ent.end_char + offset)
+            )
+
+
+# Content-addressed LRU of spaCy results: clients iterating on a note in
+# the UI re-submit identical text, and a hit skips the whole NER pass.
+_SPACY_CACHE_SIZE = 256
+_SPACY_CACHE = OrderedDict()
+_SPACY_CACHE_LOCK = threading.Lock()
+
+
+def _spacy_entities(text: str, no_cache: bool = False) -> list:
     """Return list of (label, value, start, end)."""
     if not SPACY_AVAILABLE or _nlp is None:
         return []
-    doc = _nlp(text)
+
+    key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+    if not no_cache:
+        with _SPACY_CACHE_LOCK:
+            if key in _SPACY_CACHE:
+                _SPACY_CACHE.move_to_end(key)
+                return list(_SPACY_CACHE[key])
+
+    results = _spacy_entities_uncached(text)
+
+    with _SPACY_CACHE_LOCK:
+        _SPACY_CACHE[key] = results
+        _SPACY_CACHE.move_to_end(key)
+        while len(_SPACY_CACHE) > _SPACY_CACHE_SIZE:
+            _SPACY_CACHE.popitem(last=False)
+    return list(results)
+
+
+def _spacy_entities_uncached(text: str) -> list:
     results = []
-    for ent in doc.ents:
-        label = _SPACY_LABEL_MAP.get(ent.label_)
-        if label:
-            results.append((label, ent.text, ent.start_char, ent.end_char))
+
+    if len(text) > _SPACY_CHUNK_THRESHOLD:
+        pieces = _split_paragraphs(text)
+        docs = _nlp.pipe(
+            [chunk for _, chunk in pieces],
+            batch_size=8, n_process=_SPACY_PROCS,
+        )
+        for (offset, _), doc in zip(pieces, docs):
+            _collect_ents(doc, offset, results)
+        return results
+
+    try:
+        doc = _SPACY_BATCHER.submit(text)
+    except Exception:
+        doc = _nlp(text)
+    _collect_ents(doc, 0, results)
     return results
 
 
 def _phi3_entities(text: str) -> list:
     """Return list of (label, value) — no positions."""
+    global _PHI3_JSON_GENERATOR, _PHI3_PREFIX_CACHE
+
     if not PHI3_AVAILABLE:
         return []
 
-    CHUNK = 1000
-    OVERLAP = 100
-    words = text.split()
+    # Chunk by token ids so each call packs the context window: word counts
+    # under-estimate tokens, and one encode here avoids the model
+    # re-tokenizing mid-document splits.
+    CHUNK = 3000
+    OVERLAP = 200
+    ids = _phi3_tokenizer.encode(text)
     chunks = []
     i = 0
-    while i < len(words):
-        chunks.append(" ".join(words[i: i + CHUNK]))
+    while i < len(ids):
+        chunks.append(_phi3_tokenizer.decode(ids[i: i + CHUNK]))
         i += CHUNK - OVERLAP
 
-    prompt_body = (
-        "List every piece of sensitive information in this text that could "
-        "identify a person or business. Include names, companies, addresses, "
-        "phone numbers, tax IDs, and any other PII. Return as a JSON array of "
-        "{type, value} objects only. No explanation, no markdown, just the "
-        "JSON array.\n\nText:\n"
-    )
-
     results = []
     for chunk in chunks:
-        prompt = f"<|user|>\n{prompt_body}{chunk}<|end|>\n<|assistant|>\n"
+        prompt = f"<|user|>\n{_PHI3_PROMPT_BODY}{chunk}<|end|>\n<|assistant|>\n"
         try:
-            with _PHI3_LOCK:
-                raw = _mlx_generate(
-                    _phi3_model, _phi3_tokenizer,
-                    prompt=prompt, max_tokens=500,
-                )
-            match = re.search(r"\[.*?\]", raw, re.DOTALL)
-            if match:
-                items = json.loads(match.group())
-                for item in items:
-                    if isinstance(item, dict):
-                        t = str(item.get("type", "")).upper()
-                        v = str(item.get("value", "")).strip()
-                        if v:
-                            label = _PHI3_LABEL_MAP.get(t, "PERSON")
-                            results.append((label, v))
+            # _PHI3_LOCK guards only the model invocation; parsing and
+            # label mapping stay outside so concurrent deep-scan requests
+            # serialize on nothing but the generate call itself.
+            items = None
+            if _PHI3_JSON_GENERATOR is not None:
+                try:
+                    with _PHI3_LOCK:
+                        parsed = _PHI3_JSON_GENERATOR(prompt, max_tokens=300)
+                    items = [
+                        {"type": it.type, "value": it.value}
+                        for it in parsed.items
+                    ]
+                except Exception:
+                    # Constrained decoding failed at call time; disable it
+                    # so this chunk (and the rest) takes the free-form path
+                    # rather than being dropped.
+                    _PHI3_JSON_GENERATOR = None
+            if items is None:
+                raw = None
+                if _PHI3_PREFIX_CACHE is not None:
+                    # Resume from the cached instruction prefix: only the
+                    # chunk and the assistant marker are prefilled. The
+                    # suffix is encoded without BOS so the token stream
+                    # continues the prefix; the copy keeps the shared
+                    # cache pristine since generation mutates it.
+                    try:
+                        suffix_ids = _phi3_tokenizer.encode(
+                            f"{chunk}<|end|>\n<|assistant|>\n",
+                            add_special_tokens=False,
+                        )
+                        with _PHI3_LOCK:
+                            raw = _mlx_generate(
+                                _phi3_model, _phi3_tokenizer,
+                                prompt=suffix_ids, max_tokens=500,
+                                prompt_cache=copy.deepcopy(_PHI3_PREFIX_CACHE),
+                            )
+                    except Exception:
+                        # The prefill probe at startup can succeed on an
+                        # mlx-lm whose generate() still lacks token-id
+                        # prompts or the prompt_cache kwarg. Stop using the
+                        # cache and re-run this chunk with the full prompt
+                        # instead of dropping it.
+                        _PHI3_PREFIX_CACHE = None
+                        raw = None
+                if raw is None:
+                    with _PHI3_LOCK:
+                        raw = _mlx_generate(
+                            _phi3_model, _phi3_tokenizer,
+                            prompt=prompt, max_tokens=500,
+                        )
+                match = _JSON_ARRAY_RE.search(raw)
+                items = json.loads(match.group()) if match else []
+            for item in items:
+                if isinstance(item, dict):
+                    t = str(item.get("type", "")).upper()
+                    v = str(item.get("value", "")).strip()
+                    if v:
+                        label = _PHI3_LABEL_MAP.get(t, "PERSON")
+                        results.append((label, v))
         except Exception:
             continue
 
@@ -191,48 +546,147 @@ def _phi3_entities(text: str) -> list:
 
 # ── Redaction core ──────────────────────────────────────────────────────────
 
-def _redact(text: str, deep_scan: bool = False) -> dict:
+class _IntervalSet:
+    """Disjoint (start, end) intervals with O(log n) overlap queries."""
+
+    def __init__(self):
+        self._starts = []
+        self._ends = []
+
+    def overlaps(self, start: int, end: int) -> bool:
+        i = bisect.bisect_right(self._starts, start)
+        if i > 0 and self._ends[i - 1] > start:
+            return True
+        return i < len(self._starts) and self._starts[i] < end
+
+    def add(self, start: int, end: int):
+        i = bisect.bisect_right(self._starts, start)
+        self._starts.insert(i, start)
+        self._ends.insert(i, end)
+
+    def gaps(self, length: int) -> list:
+        """Uncovered (start, end) spans within [0, length)."""
+        out = []
+        cursor = 0
+        for start, end in zip(self._starts, self._ends):
+            if start > cursor:
+                out.append((cursor, start))
+            cursor = max(cursor, end)
+        if cursor < length:
+            out.append((cursor, length))
+        return out
+
+
+# Skip spaCy when regex alone already covers this fraction of the text,
+# or when the text is too short for NER to earn its cost.
+_SPACY_SKIP_COVERAGE = 0.6
+_SPACY_MIN_CHARS = 200
+
+
+def _regex_covers(text: str, spans: list) -> bool:
+    """True if the regex layer alone makes the NER pass unlikely to help."""
+    if len(text) < _SPACY_MIN_CHARS:
+        return True
+    covered = 0
+    last_end = 0
+    for _, _, start, end in sorted(spans, key=lambda x: x[2]):
+        if end > last_end:
+            covered += end - max(start, last_end)
+            last_end = end
+    return covered / len(text) > _SPACY_SKIP_COVERAGE
+
+
+def _redact(text: str, deep_scan: bool = False, use_spacy: bool = True,
+            no_cache: bool = False) -> dict:
     """
     Run all detection layers and return redacted text + token map + counts.
     """
     # Collect positioned entities from layers 1 & 2
-    raw = []
-    raw.extend(_regex_entities(text))
-    raw.extend(_spacy_entities(text))
-
-    # Layer 3: Phi-3 (returns value strings without positions)
-    phi3_pairs = []
-    if deep_scan:
-        phi3_pairs = _phi3_entities(text)
+    raw = _regex_entities(text)
+    if use_spacy and not _regex_covers(text, raw):
+        raw.extend(_spacy_entities(text, no_cache=no_cache))
+
+    # Struct-of-arrays layout: parallel lists instead of a list of tuples,
+    # so the priority sort works on plain ints. The norm is computed once
+    # here and reused for first-seen tracking, token assignment and map
+    # lookups below.
+    labels, values, starts, ends, norms = [], [], [], [], []
+    for label, value, start, end in raw:
+        labels.append(label)
+        values.append(value)
+        starts.append(start)
+        ends.append(end)
+        norms.append(value.strip().lower())
 
     # Track first-seen original casing per normalised value
     first_seen = {}
-    for _, value, _, _ in raw:
-        first_seen.setdefault(value.strip().lower(), value)
-    for _, value in phi3_pairs:
-        first_seen.setdefault(value.strip().lower(), value)
+    for norm, value in zip(norms, values):
+        first_seen.setdefault(norm, value)
 
-    # Sort by span length descending so longer matches win overlapping spans
-    raw.sort(key=lambda x: -(x[3] - x[2]))
+    # Visit candidates longest span first so longer matches win overlapping
+    # spans; argsort over the span lengths replaces sorting tuple objects.
+    if np is not None and starts:
+        order = np.argsort(
+            np.asarray(starts, dtype=np.int32) - np.asarray(ends, dtype=np.int32),
+            kind="stable",
+        )
+    else:
+        order = sorted(range(len(starts)), key=lambda i: starts[i] - ends[i])
 
-    occupied = []
-
-    def overlaps(s, e):
-        return any(s < b and e > a for a, b in occupied)
+    occupied = _IntervalSet()
 
     clean = []
-    for label, value, start, end in raw:
-        if not overlaps(start, end):
-            occupied.append((start, end))
-            clean.append((label, value, start, end))
-
-    # Resolve Phi-3 values to positions via regex search
-    for label, value in phi3_pairs:
-        for m in re.finditer(re.escape(value), text, re.IGNORECASE):
-            if not overlaps(m.start(), m.end()):
-                occupied.append((m.start(), m.end()))
-                clean.append((label, m.group(), m.start(), m.end()))
-                first_seen.setdefault(m.group().strip().lower(), m.group())
+    for i in order:
+        start, end = starts[i], ends[i]
+        if not occupied.overlaps(start, end):
+            occupied.add(start, end)
+            clean.append((labels[i], values[i], start, end, norms[i]))
+
+    # Layer 3: Phi-3, fed only the segments layers 1 & 2 left uncovered —
+    # model cost scales with context length, and covered spans are already
+    # redacted. Values come back without positions.
+    phi3_pairs = []
+    if deep_scan:
+        segments = []
+        for a, b in occupied.gaps(len(text)):
+            seg = text[a:b]
+            if seg.strip():
+                segments.append(seg)
+        residual = "\n---\n".join(segments)
+        if residual:
+            phi3_pairs = _phi3_entities(residual)
+        for _, value in phi3_pairs:
+            first_seen.setdefault(value.strip().lower(), value)
+
+    # Resolve Phi-3 values to positions. With pyahocorasick all values are
+    # located in one walk of the text; otherwise fall back to one regex scan
+    # per value. Lowercasing both sides keeps the match case-insensitive
+    # (skip the automaton if lowercasing shifts offsets, e.g. 'İ').
+    lowered = text.lower()
+    if phi3_pairs and ahocorasick is not None and len(lowered) == len(text):
+        automaton = ahocorasick.Automaton()
+        for label, value in phi3_pairs:
+            needle = value.lower()
+            if needle:
+                automaton.add_word(needle, (label, len(needle)))
+        automaton.make_automaton()
+        for end_idx, (label, n) in automaton.iter(lowered):
+            start, end = end_idx - n + 1, end_idx + 1
+            if not occupied.overlaps(start, end):
+                occupied.add(start, end)
+                found = text[start:end]
+                norm = found.strip().lower()
+                clean.append((label, found, start, end, norm))
+                first_seen.setdefault(norm, found)
+    else:
+        for label, value in phi3_pairs:
+            for m in _compile_ci(value).finditer(text):
+                if not occupied.overlaps(m.start(), m.end()):
+                    occupied.add(m.start(), m.end())
+                    found = m.group()
+                    norm = found.strip().lower()
+                    clean.append((label, found, m.start(), m.end(), norm))
+                    first_seen.setdefault(norm, found)
 
     clean.sort(key=lambda x: x[2])
 
@@ -240,31 +694,31 @@ def _redact(text: str, deep_scan: bool = False) -> dict:
     counters = defaultdict(int)
     norm_to_token = {}
 
-    def assign(label, value):
-        key = value.strip().lower()
-        if key in norm_to_token:
-            return norm_to_token[key]
+    def assign(label, norm):
+        if norm in norm_to_token:
+            return norm_to_token[norm]
         counters[label] += 1
         token = f"[{label}_{counters[label]}]"
-        norm_to_token[key] = token
+        norm_to_token[norm] = token
         return token
 
-    # Build output
+    # Build output as one join; append is hoisted so the attribute lookup
+    # isn't repeated per entity in the hot loop.
     parts = []
+    append = parts.append
     cursor = 0
     token_map = {}
     counts = defaultdict(int)
 
-    for label, value, start, end in clean:
-        parts.append(text[cursor:start])
-        token = assign(label, value)
-        norm = value.strip().lower()
+    for label, value, start, end, norm in clean:
+        append(text[cursor:start])
+        token = assign(label, norm)
         token_map[token] = first_seen.get(norm, value)
-        parts.append(token)
+        append(token)
         cursor = end
         counts[label] += 1
 
-    parts.append(text[cursor:])
+    append(text[cursor:])
 
     return {
         "redacted_text": "".join(parts),
@@ -274,121 +728,127 @@ def _redact(text: str, deep_scan: bool = False) -> dict:
 
 
 def _restore(text: str, token_map: dict) -> dict:
-    # Replace longest tokens first to avoid partial substitutions
-    for token in sorted(token_map, key=len, reverse=True):
-        text = text.replace(token, str(token_map[token]))
+    if not token_map:
+        return {"restored_text": text}
+    # One linear pass; longest-first alternation avoids partial substitutions
+    keys = sorted(token_map, key=len, reverse=True)
+    pat = re.compile("|".join(map(re.escape, keys)))
+    text = pat.sub(lambda m: str(token_map[m.group()]), text)
     return {"restored_text": text}
 
 
-# ── HTTP handler ────────────────────────────────────────────────────────────
+# ── HTTP endpoints ──────────────────────────────────────────────────────────
+#
+# Handlers are async; the CPU-bound spaCy/Phi-3 work runs in worker threads
+# via asyncio.to_thread so the event loop keeps serving other clients.
 
-_CORS = {
-    "Access-Control-Allow-Origin":  "*",
-    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-    "Access-Control-Allow-Headers": "Content-Type",
-}
+async def _read_body(request) -> dict:
+    try:
+        if orjson is not None:
+            body = orjson.loads(await request.body())
+        else:
+            body = await request.json()
+    except Exception as exc:
+        raise ValueError(f"invalid JSON: {exc}")
+    if not isinstance(body, dict):
+        raise ValueError("invalid JSON: object expected")
+    return body
 
 
-class Handler(BaseHTTPRequestHandler):
+async def status_endpoint(request):
+    return _JSONResponse({
+        "status": "ok",
+        "spacy": SPACY_AVAILABLE,
+        "phi3": PHI3_AVAILABLE,
+        "model": "Phi-3-mini-4k-instruct-4bit" if PHI3_AVAILABLE else None,
+    })
 
-    # ── routing ───────────────────────────────────────────────────────────
 
-    def do_OPTIONS(self):
-        self.send_response(204)
-        for k, v in _CORS.items():
-            self.send_header(k, v)
-        self.end_headers()
+async def redact_endpoint(request):
+    try:
+        body = await _read_body(request)
+    except ValueError as exc:
+        return _JSONResponse({"error": str(exc)}, status_code=400)
+    text = body.get("text", "")
+    if not isinstance(text, str) or not text.strip():
+        return _JSONResponse({"error": "'text' field required"}, status_code=400)
+    deep_scan = bool(body.get("deep_scan", False))
+    use_spacy = bool(body.get("use_spacy", True))
+    no_cache = bool(body.get("no_cache", False))
+    try:
+        result = await asyncio.to_thread(
+            _redact, text, deep_scan=deep_scan, use_spacy=use_spacy,
+            no_cache=no_cache,
+        )
+        return _JSONResponse(result)
+    except Exception as exc:
+        return _JSONResponse({"error": str(exc)}, status_code=500)
 
-    def do_GET(self):
-        if self.path == "/status":
-            self._handle_status()
-        else:
-            self._send_json(404, {"error": "not found"})
-
-    def do_POST(self):
-        body = self._read_body()
-        if body is None:
-            return
-        if self.path == "/redact":
-            self._handle_redact(body)
-        elif self.path == "/restore":
-            self._handle_restore(body)
-        else:
-            self._send_json(404, {"error": "not found"})
-
-    # ── endpoint handlers ─────────────────────────────────────────────────
-
-    def _handle_status(self):
-        self._send_json(200, {
-            "status": "ok",
-            "spacy": SPACY_AVAILABLE,
-            "phi3": PHI3_AVAILABLE,
-            "model": "Phi-3-mini-4k-instruct-4bit" if PHI3_AVAILABLE else None,
-        })
-
-    def _handle_redact(self, body: dict):
-        text = body.get("text", "")
-        if not isinstance(text, str) or not text.strip():
-            self._send_json(400, {"error": "'text' field required"})
-            return
-        deep_scan = bool(body.get("deep_scan", False))
-        try:
-            self._send_json(200, _redact(text, deep_scan=deep_scan))
-        except Exception as exc:
-            self._send_json(500, {"error": str(exc)})
-
-    def _handle_restore(self, body: dict):
-        text = body.get("text", "")
-        token_map = body.get("map", {})
-        if not isinstance(text, str):
-            self._send_json(400, {"error": "'text' field required"})
-            return
-        if not isinstance(token_map, dict):
-            self._send_json(400, {"error": "'map' must be an object"})
-            return
-        try:
-            self._send_json(200, _restore(text, token_map))
-        except Exception as exc:
-            self._send_json(500, {"error": str(exc)})
 
-    # ── helpers ───────────────────────────────────────────────────────────
+async def restore_endpoint(request):
+    try:
+        body = await _read_body(request)
+    except ValueError as exc:
+        return _JSONResponse({"error": str(exc)}, status_code=400)
+    text = body.get("text", "")
+    token_map = body.get("map", {})
+    if not isinstance(text, str):
+        return _JSONResponse({"error": "'text' field required"}, status_code=400)
+    if not isinstance(token_map, dict):
+        return _JSONResponse({"error": "'map' must be an object"}, status_code=400)
+    try:
+        result = await asyncio.to_thread(_restore, text, token_map)
+        return _JSONResponse(result)
+    except Exception as exc:
+        return _JSONResponse({"error": str(exc)}, status_code=500)
 
-    def _read_body(self):
-        try:
-            length = int(self.headers.get("Content-Length", 0))
-            return json.loads(self.rfile.read(length))
-        except Exception as exc:
-            self._send_json(400, {"error": f"invalid JSON: {exc}"})
-            return None
-
-    def _send_json(self, status: int, data: dict):
-        payload = json.dumps(data, ensure_ascii=False).encode()
-        self.send_response(status)
-        self.send_header("Content-Type", "application/json")
-        self.send_header("Content-Length", str(len(payload)))
-        for k, v in _CORS.items():
-            self.send_header(k, v)
-        self.end_headers()
-        self.wfile.write(payload)
-
-    def log_message(self, fmt, *args):
-        print(f"  {args[0]}  {args[1]}", flush=True)
 
+# Bound the to_thread worker pool: unbounded concurrency just thrashes the
+# GIL once every worker is inside spaCy/Phi-3, and burst load should queue
+# rather than stack up threads.
+_HTTP_THREADS = int(os.environ.get("REDACTOR_THREADS", "8"))
 
-# ── Server startup ──────────────────────────────────────────────────────────
 
-class _ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
-    daemon_threads = True
+@asynccontextmanager
+async def _lifespan(app):
+    executor = ThreadPoolExecutor(
+        max_workers=_HTTP_THREADS, thread_name_prefix="redactor",
+    )
+    asyncio.get_running_loop().set_default_executor(executor)
+    try:
+        yield
+    finally:
+        executor.shutdown(wait=False)
+
+
+app = Starlette(
+    lifespan=_lifespan,
+    routes=[
+        Route("/redact", redact_endpoint, methods=["POST"]),
+        Route("/restore", restore_endpoint, methods=["POST"]),
+        Route("/status", status_endpoint),
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=["*"],
+            allow_methods=["GET", "POST", "OPTIONS"],
+            allow_headers=["Content-Type"],
+        ),
+    ],
+)
 
 
+# ── Server startup ──────────────────────────────────────────────────────────
+
 if __name__ == "__main__":
-    server = _ThreadedHTTPServer(("localhost", 8765), Handler)
     print("\nRedactor server ready on http://localhost:8765", flush=True)
     print(f"  spaCy : {'ready' if SPACY_AVAILABLE else 'disabled'}", flush=True)
     print(f"  Phi-3 : {'ready' if PHI3_AVAILABLE else 'disabled'}", flush=True)
     print("  Press Ctrl+C to stop\n", flush=True)
     try:
-        server.serve_forever()
+        uvicorn.run(app, host="localhost", port=8765, log_level="warning")
     except KeyboardInterrupt:
-        print("\nServer stopped.")
-        sys.exit(0)
+        pass
+    print("\nServer stopped.")
+    sys.exit(0)